@@ -1,16 +1,16 @@
 # standard library imports
 import argparse
+import functools
 import logging
-import re
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple, dataclass, fields
 
 
 # 3rd party imports
-import xmltodict
-from netmiko import ConnectHandler
-from tabulate import tabulate
+# netmiko, Firewall and tabulate are imported lazily where they are
+# used: netmiko only matters on the SSH fallback path and the others
+# only once the firewall sweep actually runs
 from panos.errors import PanDeviceError
-from panos.firewall import Firewall
 from panos.panorama import Panorama
 from config import settings
 
@@ -41,6 +41,12 @@ parser.add_argument(
 args = parser.parse_args()
 
 
+# XML API commands
+REDIST_STATUS_CMD = "<show><redistribution><service><status/></service></redistribution></show>"
+REDIST_CLIENTS_CMD = "<show><redistribution><service><client>all</client></service></redistribution></show>"
+SYSTEM_INFO_CMD = "<show><system><info/></system></show>"
+
+
 # Configure logging
 if args.debug:
     logging.basicConfig(level=logging.DEBUG)
@@ -49,12 +55,18 @@ else:
 
 
 def connect_to_panorama(host, username, password):
+    from netmiko import ConnectHandler
+
     panorama_device = {
         "device_type": "paloalto_panos",
         "host": host,
         "username": username,
         "password": password,
         "port": 22,
+        # only one deterministic show command is sent, so the tightened
+        # fast_cli timings are safe and skip most of netmiko's sleeps
+        "fast_cli": True,
+        "global_delay_factor": 0.1,
     }
 
     try:
@@ -68,9 +80,21 @@ def connect_to_panorama(host, username, password):
 
 
 def send_command_to_panorama(net_connect, command):
+    from netmiko.exceptions import ReadTimeout
+
     try:
         logging.debug(f"Sending command: {command}")
-        output = net_connect.send_command(command, expect_string=r">")
+        try:
+            output = net_connect.send_command(
+                command, expect_string=r">", read_timeout=10
+            )
+        except ReadTimeout:
+            # the fast timings were too aggressive for this appliance;
+            # retry once with a generous timeout
+            logging.debug("Command timed out, retrying with relaxed timing.")
+            output = net_connect.send_command(
+                command, expect_string=r">", read_timeout=60
+            )
         logging.debug("Command executed.")
         return output
 
@@ -79,20 +103,23 @@ def send_command_to_panorama(net_connect, command):
         return None
 
 
+@functools.lru_cache(maxsize=256)
 def parse_status_command_output(output):
-    # Regex patterns for different lines
-    patterns = {
-        "redistribution_status": r"Redistribution service:\s+(?P<status>\w+)",
-        "ssl_config": r"SSL config:\s+(?P<ssl_config>.+)",
-        "number_of_clients": r"number of clients:\s+(?P<clients>\d+)",
-    }
-
-    # Parsing and extracting data
+    # Parsing and extracting data; the output is line-oriented with
+    # fixed prefixes, so plain string ops beat the regex engine here
     parsed_data = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output)
-        if match:
-            parsed_data[key] = match.group(1)
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("Redistribution service:"):
+            parts = line.split(":", 1)[1].split()
+            if parts:
+                parsed_data["redistribution_status"] = parts[0]
+        elif line.startswith("SSL config:"):
+            parsed_data["ssl_config"] = line.split(":", 1)[1].strip()
+        elif line.startswith("number of clients:"):
+            clients = line.rsplit(None, 1)[-1]
+            if clients.isdigit():
+                parsed_data["number_of_clients"] = clients
 
     # Specific transformations for certain fields
     if "ssl_config" in parsed_data:
@@ -106,80 +133,152 @@ def parse_status_command_output(output):
     return parsed_data
 
 
-def parse_xml_response(response):
-    """Converts XML response to a dictionary."""
-    result_xml = ET.tostring(response, encoding="utf-8").decode("utf-8")
-    return xmltodict.parse(result_xml)
+@dataclass(frozen=True, slots=True)
+class FwRow:
+    """One row of the output table; slots keep per-firewall rows small."""
+
+    hostname: str
+    ipaddress: str
+    serial: str
+    model: str
+    sw_version: str
+    app_version: str
+    device_cert_status: str
+    redistr_server: bool
+
+
+def firewall_row_from_element(element, is_redistribution_server):
+    """Builds an output row from a system-info style element."""
+    return FwRow(
+        hostname=element.findtext("hostname"),
+        ipaddress=element.findtext("ip-address"),
+        serial=element.findtext("serial"),
+        model=element.findtext("model"),
+        sw_version=element.findtext("sw-version"),
+        app_version=element.findtext("app-version"),
+        device_cert_status=element.findtext("device-certificate-status"),
+        redistr_server=is_redistribution_server,
+    )
+
+
+def get_status_via_api(pan):
+    """Reads the redistribution service status over the XML API.
+
+    Returns the same dict shape as parse_status_command_output, or None
+    when the response is missing the ssl config -- some releases leave it
+    out of the XML API, in which case the caller falls back to scraping
+    the CLI over SSH.
+    """
+    try:
+        response = pan.op(cmd=REDIST_STATUS_CMD, cmd_xml=False)
+    except PanDeviceError as pan_device_error:
+        logging.debug(f"XML status command failed: {pan_device_error}")
+        return None
+
+    status = response.findtext("./result/status")
+    ssl_config = response.findtext("./result/ssl-config")
+    if status is None or ssl_config is None:
+        return None
+
+    parsed_data = {
+        "redistribution_status": status,
+        "ssl_config": ssl_config.lower().replace(" ", "_"),
+    }
+    clients = response.findtext("./result/clients")
+    if clients is not None:
+        parsed_data["number_of_clients"] = int(clients)
+    return parsed_data
+
+
+def gather_firewall_info(firewall):
+    """Runs the per-firewall redistribution command, returning the raw response."""
+    return firewall.op(cmd=REDIST_CLIENTS_CMD, cmd_xml=False)
 
 
 if __name__ == "__main__":
-    # Netmiko work
-    net_connect = connect_to_panorama(
+    # create a panorama object
+    pan = Panorama(
         args.hostname,
         args.username,
         args.password,
     )
 
-    # show redistribution service status
-    if net_connect:
-        # using netmiko because the XML is missing the ssl config
-        show_redistribution_service_status = send_command_to_panorama(
-            net_connect,
-            "show redistribution service status",
-        )
-        if show_redistribution_service_status:
-            logging.debug("Command output:")
-            logging.debug(show_redistribution_service_status)
-            parsed_output = parse_status_command_output(
-                show_redistribution_service_status
-            )
-            logging.debug(parsed_output)
-        else:
-            logging.debug("No output received from the command.")
+    # validate creds and fetch the service status concurrently; they are
+    # independent round-trips to the same appliance, so overlap them
+    # rather than paying for each in turn. The status fetch gets its own
+    # Panorama object: a device's xapi holds per-call response state, so
+    # two in-flight requests must not share one
+    status_pan = Panorama(
+        args.hostname,
+        args.username,
+        args.password,
+    )
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        refresh_future = executor.submit(pan.refresh_system_info)
+        # prefer the XML API for the service status: one round-trip
+        # instead of a full SSH login
+        status_future = executor.submit(get_status_via_api, status_pan)
 
-        net_connect.disconnect()
-    else:
-        logging.error("Unable to establish connection with the device.")
+        try:
+            refresh_future.result()
+            logging.debug("Successfully connected to Panorama with credientials")
+        except PanDeviceError as pan_device_error:
+            logging.error(f"Failed to connect to Panorama: {pan_device_error}")
 
-    # check to see if redistribution_status is equal to `up`` and ssl_config is NOT `default_certificates`
-    if (
-        parsed_output["redistribution_status"] == "up"
-        and parsed_output["ssl_config"] == "default_certificates"
-    ):
-        # create a panorama object
-        pan = Panorama(
+        parsed_output = status_future.result()
+
+    if parsed_output is None:
+        # Netmiko fallback, for when the XML is missing the ssl config
+        net_connect = connect_to_panorama(
             args.hostname,
             args.username,
             args.password,
         )
 
-        # validate creds
-        try:
-            pan.refresh_system_info()
-            logging.debug("Successfully connected to Panorama with credientials")
-        except PanDeviceError as pan_device_error:
-            logging.error(f"Failed to connect to Panorama: {pan_device_error}")
+        # show redistribution service status
+        if net_connect:
+            show_redistribution_service_status = send_command_to_panorama(
+                net_connect,
+                "show redistribution service status",
+            )
+            if show_redistribution_service_status:
+                logging.debug("Command output:")
+                logging.debug(show_redistribution_service_status)
+                parsed_output = parse_status_command_output(
+                    show_redistribution_service_status
+                )
+            else:
+                logging.debug("No output received from the command.")
+
+            net_connect.disconnect()
+        else:
+            logging.error("Unable to establish connection with the device.")
+
+    # if both paths came up empty we still want the checks below to fail
+    # cleanly rather than blow up on a missing key
+    parsed_output = parsed_output or {}
+    logging.debug(parsed_output)
+
+    # check to see if redistribution_status is equal to `up`` and ssl_config is NOT `default_certificates`
+    status_ok = parsed_output.get("redistribution_status") == "up"
+    ssl_default = parsed_output.get("ssl_config") == "default_certificates"
+    if status_ok and ssl_default:
+        from tabulate import tabulate
+        from panos.firewall import Firewall
 
         # first API call to retreive all redistribution clients
         redist_clients = pan.op(
-            cmd="<show><redistribution><service><client>all</client></service></redistribution></show>",
+            cmd=REDIST_CLIENTS_CMD,
             cmd_xml=False,
         )
 
-        # flip to python dict
-        list_of_redist_clients = parse_xml_response(redist_clients)
-        logging.debug(f"list_of_redist_clients: {list_of_redist_clients}")
-
-        # check to see if the response returns a single entry or a list of entries
-        if isinstance(list_of_redist_clients["response"]["result"]["entry"], dict):
-            firewall = Firewall(
-                serial=list_of_redist_clients["response"]["result"]["entry"]["host"]
-            )
-            pan.add(firewall)
-        else:
-            for each in list_of_redist_clients["response"]["result"]["entry"]:
-                firewall = Firewall(serial=each["host"])
-                pan.add(firewall)
+        # iterate the entries lazily and clear each one once the host is
+        # pulled out, so a huge client list never piles up extra memory;
+        # bind pan.add once rather than re-resolving it per entry
+        add_firewall = pan.add
+        for entry in redist_clients.iterfind("./result/entry"):
+            add_firewall(Firewall(serial=entry.findtext("host")))
+            entry.clear()
 
         # debug
         logging.debug(pan.children)
@@ -189,52 +288,49 @@ if __name__ == "__main__":
         show_devices_connected = pan.op(
             cmd="<show><devices><connected/></devices></show>", cmd_xml=False
         )
-        list_of_connected_devices = parse_xml_response(show_devices_connected)
-        # logging.debug(f"list_of_connected_devices: {list_of_connected_devices}")
+
+        # the connected-devices response already carries each firewall's
+        # system info, so index it by serial instead of asking every
+        # firewall for `show system info` separately
+        sysinfo_by_serial = {
+            entry.findtext("serial"): entry
+            for entry in show_devices_connected.findall("./result/devices/entry")
+        }
 
         redis_client_list = []
 
-        for firewall in pan.children:
-            show_redistribution_client_all = firewall.op(
-                cmd="<show><redistribution><service><client>all</client></service></redistribution></show>",
-                cmd_xml=False,
-            )
-            redist_client_firewall_info = parse_xml_response(
-                show_redistribution_client_all
+        # fan the per-firewall op calls out over a thread pool so the
+        # network round-trips overlap; each Firewall has its own session
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(gather_firewall_info, pan.children))
+
+        for firewall, show_redistribution_client_all in zip(pan.children, results):
+            info_element = sysinfo_by_serial.get(firewall.serial)
+            if (
+                info_element is None
+                or info_element.findtext("device-certificate-status") is None
+            ):
+                # not in the connected-devices map, or the entry lacks
+                # the cert-status field only `show system info` carries;
+                # fall back to asking the firewall directly
+                show_system_info = firewall.op(cmd=SYSTEM_INFO_CMD, cmd_xml=False)
+                info_element = show_system_info.find("./result/system")
+
+            # Check if the result element carries any client entries
+            result = show_redistribution_client_all.find("./result")
+            is_redistribution_server = result is not None and (
+                len(result) > 0 or bool((result.text or "").strip())
             )
-            logging.debug(redist_client_firewall_info)
 
-            show_system_info = firewall.op(
-                cmd="<show><system><info/></system></show>", cmd_xml=False
-            )
-            system_info = parse_xml_response(show_system_info)
-            fw_info = system_info["response"]["result"]["system"]
-            fw = {
-                "hostname": fw_info["hostname"],
-                "ipaddress": fw_info["ip-address"],
-                "serial": fw_info["serial"],
-                "model": fw_info["model"],
-                "sw_version": fw_info["sw-version"],
-                "app_version": fw_info["app-version"],
-                "device_cert_status": fw_info["device-certificate-status"],
-            }
-            # Check if redist_client_firewall_info["response"]["result"] is None
-            is_redistribution_server = (
-                redist_client_firewall_info["response"]["result"] is not None
+            redis_client_list.append(
+                firewall_row_from_element(info_element, is_redistribution_server)
             )
 
-            # Add the new key/value pair to the fw dictionary
-            fw["redistr_server"] = is_redistribution_server
-
-            redis_client_list.append(fw)
-
-        # Extract headers from the first dictionary in the list
-        headers = list(redis_client_list[0].keys()) if redis_client_list else []
-
-        # Convert dictionaries to lists of values
-        table_data = [list(item.values()) for item in redis_client_list]
-
-        # Use tabulate to create a table
-        table = tabulate(table_data, headers, tablefmt="grid")
-
-        print(table)
+        # Use tabulate to create a table, field names as headers
+        print(
+            tabulate(
+                [astuple(row) for row in redis_client_list],
+                headers=[field.name for field in fields(FwRow)],
+                tablefmt="grid",
+            )
+        )